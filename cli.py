@@ -0,0 +1,224 @@
+import argparse
+import hashlib
+import os
+import sys
+import pandas as pd
+from repos import GITHUB_API_URL
+
+
+# Function to parse a shard specification of the form "i/N" into a (index, count) tuple
+def parse_shard(value):
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', expected the form i/N (e.g. 0/4)")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}', index must be in the range 0..N-1")
+    return index, count
+
+
+# Function to decide which shard a repository belongs to.
+# The shard only depends on the URL, so every machine computes the same partition
+# independently of the row order, and re-sharding a shard's own output is a no-op.
+def shard_of(repo_url, count):
+    digest = hashlib.sha1(repo_url.strip().lower().encode("utf-8")).hexdigest()
+    return int(digest, 16) % count
+
+
+# Function to keep only the repositories that belong to the given shard
+def select_shard(repositories_df, shard):
+    if shard is None:
+        return repositories_df
+    index, count = shard
+    mask = repositories_df["Repository URL"].map(lambda url: shard_of(url, count) == index)
+    return repositories_df[mask]
+
+
+# Function to derive the per-shard output file name, e.g. rates.csv -> rates.shard-0-of-4.csv
+def shard_output_path(path, shard):
+    if shard is None:
+        return path
+    index, count = shard
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{index}-of-{count}{ext}"
+
+
+# Function to load the repository list and restrict it to the requested shard
+def load_repositories(input_path, shard):
+    repositories_df = pd.read_csv(input_path)
+    selected_df = select_shard(repositories_df, shard).reset_index(drop=True)
+    if shard is not None:
+        print(f"Shard {shard[0]}/{shard[1]}: {len(selected_df)} of {len(repositories_df)} repositories")
+    return selected_df
+
+
+# Function to set the OpenAI API key for the language model prompts
+def set_openai_key(api_key):
+    if api_key:
+        os.environ["OPENAI_API_KEY"] = api_key
+
+
+# Subcommand: search GitHub for candidate repositories
+def run_discover(args):
+    from repos import search_repositories
+    from utils import check_github_api_credentials
+
+    if not check_github_api_credentials(args.api_url, args.github_token):
+        return 1
+
+    query_terms = " OR ".join(args.query_terms)
+    df = search_repositories(args.language, args.num_repos, args.year, args.max_tokens, query_terms,
+                             args.github_token, output_path=args.output, api_url=args.api_url,
+                             max_workers=args.max_workers, max_candidates=args.max_candidates,
+                             cursor_path=args.cursor)
+    if df is None:
+        return 1
+    print(df)
+    return 0
+
+
+# Function to set up the workspace for the cloned repositories and improved outputs
+def setup_workspace(args):
+    from workspace import configure_workspace, parse_size
+
+    # Every shard gets its own directories, because a workspace must not be shared by running processes
+    checkout_dir = args.workspace_dir or shard_output_path("./repos", args.shard)
+    improved_dir = args.improved_dir or shard_output_path("./improved_repos", args.shard)
+    return configure_workspace(checkout_dir=checkout_dir, improved_dir=improved_dir,
+                               quota_bytes=parse_size(args.disk_quota), use_tmpfs=args.tmpfs,
+                               keep_improved=args.keep_improved)
+
+
+# Function to run a pipeline function within one workspace and report its usage afterwards
+def run_in_workspace(args, pipeline, *output_paths):
+    set_openai_key(args.openai_api_key)
+    repositories_df = load_repositories(args.input, args.shard)
+    workspace = setup_workspace(args)
+    try:
+        pipeline(repositories_df, *(shard_output_path(path, args.shard) for path in output_paths))
+    finally:
+        workspace.report()
+        workspace.close()
+    return 0
+
+
+# Subcommand: rate the original repositories
+def run_score(args):
+    from main import score_repositories
+
+    return run_in_workspace(args, score_repositories, args.output)
+
+
+# Subcommand: improve the repositories and rate the improved versions
+def run_improve(args):
+    from main import improve_repositories
+
+    return run_in_workspace(args, improve_repositories, args.output)
+
+
+# Subcommand: score and improve one repository after the other, so every repository is cloned only once
+def run_pipeline(args):
+    from main import score_and_improve_repositories
+
+    return run_in_workspace(args, score_and_improve_repositories, args.output, args.improved_output)
+
+
+# Subcommand: combine the per-shard result files into a single file
+def run_merge(args):
+    frames = [pd.read_csv(path) for path in args.inputs]
+    merged_df = pd.concat(frames, ignore_index=True)
+
+    # A repository that was processed more than once (e.g. a re-run shard) keeps the row of the
+    # file given last on the command line. Rows that disagree are listed, so a stale file is noticed.
+    duplicates = merged_df[merged_df.duplicated(subset="Repository URL", keep=False)]
+    conflicts = [url for url, rows in duplicates.groupby("Repository URL")
+                 if len(rows.drop_duplicates()) > 1]
+    for url in conflicts:
+        print(f"Conflicting results for {url}, keeping the one from the last file")
+    merged_df = merged_df.drop_duplicates(subset="Repository URL", keep="last")
+
+    if args.order:
+        # Restore the order of the original repository list
+        order = pd.read_csv(args.order)["Repository URL"].tolist()
+        position = {url: i for i, url in enumerate(order)}
+        merged_df = merged_df.sort_values("Repository URL", key=lambda urls: urls.map(position),
+                                          na_position="last", kind="stable")
+
+    merged_df.to_csv(args.output, index=False)
+    print(f"Merged {len(args.inputs)} files with {len(merged_df)} repositories into '{args.output}'")
+    return 0
+
+
+# Function to build the argument parser with all subcommands
+def build_parser():
+    parser = argparse.ArgumentParser(description="Rate and improve the naming quality of GitHub repositories.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    discover = subparsers.add_parser("discover", help="search GitHub for candidate repositories")
+    discover.add_argument("--language", default="Python")
+    discover.add_argument("--num-repos", type=int, default=10)
+    discover.add_argument("--year", default="2022",
+                          help="creation year (2022) or date range (2022-01-01..2022-06-30)")
+    discover.add_argument("--max-tokens", type=int, default=5000)
+    discover.add_argument("--query-terms", nargs="+", default=["test", "example"])
+    discover.add_argument("--github-token", default=os.environ.get("GITHUB_TOKEN", ""),
+                          help="GitHub API token (default: $GITHUB_TOKEN)")
+    discover.add_argument("--output", default="repositories.csv")
+    discover.add_argument("--api-url", default=GITHUB_API_URL)
+    discover.add_argument("--max-workers", type=int, default=8, help="number of concurrent API requests")
+    discover.add_argument("--max-candidates", type=int, default=1000,
+                          help="stop searching once this many candidates were found")
+    discover.add_argument("--cursor", default="discovery_cursor.json",
+                          help="file to store the search progress in, an interrupted search resumes from it")
+    discover.set_defaults(func=run_discover)
+
+    for name, output, func, help_text in [
+        ("score", "rates.csv", run_score, "rate the original repositories"),
+        ("improve", "rates_improved.csv", run_improve, "improve the repositories and rate the result"),
+        ("pipeline", "rates.csv", run_pipeline, "score and improve the repositories in one run"),
+    ]:
+        command = subparsers.add_parser(name, help=help_text)
+        command.add_argument("--input", default="repositories.csv")
+        command.add_argument("--output", default=output,
+                             help="result file; with --shard the shard suffix is added automatically")
+        command.add_argument("--shard", type=parse_shard, default=None,
+                             help="only process shard i of N (e.g. 0/4)")
+        command.add_argument("--openai-api-key", default=os.environ.get("OPENAI_API_KEY", ""),
+                             help="OpenAI API key (default: $OPENAI_API_KEY)")
+        command.add_argument("--workspace-dir", default=None,
+                             help="directory for the cloned repositories (default: ./repos, with --shard "
+                                  "./repos.shard-i-of-N); must not be used by two processes at the same time")
+        command.add_argument("--improved-dir", default=None,
+                             help="directory for the improved repositories (default: ./improved_repos, with "
+                                  "--shard ./improved_repos.shard-i-of-N)")
+        command.add_argument("--disk-quota", default="2G",
+                             help="evict unused checkouts and rated improved outputs beyond this size "
+                                  "(e.g. 500M, 2G)")
+        command.add_argument("--keep-improved", action="store_true",
+                             help="never evict improved outputs, warn when they exceed the disk quota")
+        command.add_argument("--tmpfs", action="store_true",
+                             help="keep the checkouts in a temporary directory on tmpfs (/dev/shm), "
+                                  "removed at the end of the run")
+        if name == "pipeline":
+            command.add_argument("--improved-output", default="rates_improved.csv")
+        command.set_defaults(func=func)
+
+    merge = subparsers.add_parser("merge", help="combine per-shard result files")
+    merge.add_argument("inputs", nargs="+",
+                       help="per-shard result files, for duplicate repositories the last file wins")
+    merge.add_argument("--output", required=True)
+    merge.add_argument("--order", default=None,
+                       help="repository list whose order the merged file should follow")
+    merge.set_defaults(func=run_merge)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+# Entry point of the script
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,6 @@
 from syntactic_metric import rate_repository_syntactic
-from utils import delete_repo
-import pandas as pd
-import os
+from workspace import get_workspace
+import sys
 from openai_prompts import prompt_langchain
 
 
@@ -18,7 +17,8 @@ def evaluate_repo(index, row, dataframe, is_improved=False):
 
     # Get syntactic and semantic scores for the repository
     syntactic_score = rate_repository_syntactic(repo_name, repo_source)
-    semantic_score = prompt_langchain(repo_url if not is_improved else f"./improved_repos/{repo_name}", 'rate')
+    semantic_source = repo_url if not is_improved else get_workspace().improved_path(repo_url)
+    semantic_score = prompt_langchain(semantic_source, 'rate')
 
     # Combine both scores into a single dictionary
     score = {**syntactic_score, **semantic_score}
@@ -28,40 +28,70 @@ def evaluate_repo(index, row, dataframe, is_improved=False):
     dataframe.at[index, "Semantic Rating"] = score["semantic_score"]
     dataframe.at[index, "Syntactic Rating"] = score["syntactic_score"]
 
-    # Delete the repository if it's not improved
-    if not is_improved:
-        delete_repo(repo_url)
+    return dataframe
+
+
+# Function to improve a single repository and rate the improved version
+def improve_repo(index, row, dataframe):
+    repo_url = row["Repository URL"]
+    # The reference is released by run_repository_stages once the rating is saved
+    get_workspace().acquire_improved(repo_url)
+    # Run code improvement for the repository
+    prompt_langchain(repo_url, 'improve')
+    # Evaluate and update DataFrame with new scores for the improved repository
+    return evaluate_repo(index, row, dataframe, is_improved=True)
+
 
+# Function to initialize the rating columns, so an output only contains the ratings of its own stage
+def reset_ratings(dataframe):
+    dataframe["Semantic Rating"] = None
+    dataframe["Syntactic Rating"] = None
     return dataframe
 
 
-if __name__ == "__main__":
-    # Unused variables; consider removing if not needed.
-    GITHUB_API_URL = "https://api.github.com"
-    github_token = ""
-
-    # Load repository data from CSV into a DataFrame
-    repositories_df = pd.read_csv("repositories.csv")
-    # Initialize columns for semantic and syntactic ratings
-    repositories_df["Semantic Rating"] = None
-    repositories_df["Syntactic Rating"] = None
-
-    # Check if rates.csv already exists
-    if not os.path.exists("rates.csv"):
-        # Iterate through each repository to evaluate it
-        for index, row in repositories_df.iterrows():
-            # Evaluate and update DataFrame with new scores
-            repositories_df = evaluate_repo(index, row, repositories_df)
-            # Save updated DataFrame to rates.csv
-            repositories_df.to_csv("rates.csv", index=False)
-            print('\n\n\n')
-
-    # Iterate through each repository to improve and evaluate it
+# Function to run the given stages for every repository while holding its checkout in the workspace.
+# All stages of a repository run before the next repository is processed, so the checkout is
+# still on disk for every stage, no matter how small the disk quota is.
+def run_repository_stages(repositories_df, stages):
+    workspace = get_workspace()
+    results = [(stage, reset_ratings(repositories_df.copy()), output_path) for stage, output_path in stages]
+
+    # Iterate through each repository and run all stages on it
     for index, row in repositories_df.iterrows():
-        # Run code improvement for the repository
-        prompt_langchain(row["Repository URL"], 'improve')
-        # Evaluate and update DataFrame with new scores for the improved repository
-        repositories_df = evaluate_repo(index, row, repositories_df, is_improved=True)
-        # Save updated DataFrame to rates_improved.csv
-        repositories_df.to_csv("rates_improved.csv", index=False)
+        workspace.acquire(row["Repository URL"])
+        try:
+            for i, (stage, dataframe, output_path) in enumerate(results):
+                dataframe = stage(index, row, dataframe)
+                results[i] = (stage, dataframe, output_path)
+                # Save updated DataFrame after every repository so partial results survive a crash
+                dataframe.to_csv(output_path, index=False)
+        finally:
+            workspace.release_improved(row["Repository URL"])
+            workspace.release(row["Repository URL"])
         print('\n\n\n')
+
+    return [dataframe for _, dataframe, _ in results]
+
+
+# Function to rate every repository in the DataFrame and save the results
+def score_repositories(repositories_df, output_path="rates.csv"):
+    return run_repository_stages(repositories_df, [(evaluate_repo, output_path)])[0]
+
+
+# Function to improve every repository in the DataFrame and rate the improved versions
+def improve_repositories(repositories_df, output_path="rates_improved.csv"):
+    return run_repository_stages(repositories_df, [(improve_repo, output_path)])[0]
+
+
+# Function to rate, improve and rate again every repository, one repository at a time
+def score_and_improve_repositories(repositories_df, output_path="rates.csv",
+                                   improved_output_path="rates_improved.csv"):
+    return run_repository_stages(repositories_df, [(evaluate_repo, output_path),
+                                                   (improve_repo, improved_output_path)])
+
+
+# Entry point of the script, see cli.py for the available subcommands
+if __name__ == "__main__":
+    from cli import main
+
+    sys.exit(main())
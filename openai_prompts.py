@@ -6,6 +6,7 @@ from langchain.text_splitter import (
 )
 import os
 from utils import get_repo
+from workspace import get_workspace
 from langchain.chat_models import ChatOpenAI
 from langchain import PromptTemplate, LLMChain
 from langchain.memory import ConversationBufferMemory
@@ -90,7 +91,7 @@ def extract_json_from_string(s):
 
 # Function to index a given repository or file
 def index_repo(repo_url):
-    os.environ['OPENAI_API_KEY'] = ""
+    os.environ.setdefault('OPENAI_API_KEY', "")
 
     contents = []
     fileextensions = [
@@ -123,10 +124,7 @@ def index_repo(repo_url):
 
 def prompt_langchain(repo_url, type):
     # Setting up environment variables
-    os.environ['OPENAI_API_KEY'] = ""
-
-    # Extract repository name from the URL
-    repo_name = "/".join(repo_url.split("/")[-2:])
+    os.environ.setdefault('OPENAI_API_KEY', "")
 
     # Index the repository and get code chunks
     codes = index_repo(repo_url)
@@ -194,10 +192,7 @@ def prompt_langchain(repo_url, type):
 
     # Code for improving the repository
     if type == 'improve':
-        root_name = './improved_repos'
-
-        if not os.path.exists(root_name):
-            os.makedirs(root_name)
+        improved_dir = get_workspace().improved_path(repo_url)
 
         previous_filename = None
         for idx, code in enumerate(codes):
@@ -215,10 +210,10 @@ def prompt_langchain(repo_url, type):
                 result = chain.run(text=text + filename + '\n\n' + str(code.page_content))
                 code_blocks =result
                 if code_blocks:
-                    if not os.path.exists(os.path.join(root_name, repo_name)):
-                        os.makedirs(os.path.join(root_name, repo_name))
+                    if not os.path.exists(improved_dir):
+                        os.makedirs(improved_dir)
 
-                    file_path = os.path.join(root_name, repo_name, filename)
+                    file_path = os.path.join(improved_dir, filename)
 
                     with open(file_path, 'a') as f:
                         f.write(code_blocks + '\n')
@@ -1,6 +1,6 @@
 import ast
 import os
-from utils import get_repo
+from workspace import get_workspace
 
 
 # Function to analyze Python code for function, class, variable, and constant names
@@ -56,21 +56,13 @@ def analyze_code(file_path):
 # Function to analyze an entire repository for function, class, variable, and constant names
 def analyze_repository(repo_name, type):
     results = []
+    workspace = get_workspace()
     if type == 'github':
-        repo_url = f'https://github.com/{repo_name}'
-        repo_dir = os.path.abspath(f'./repos/{repo_name}')
-
-        # Clone the repo if it does not exist locally
-        if not os.path.exists(repo_dir):
-            if repo_url:
-                print(f"Repo {repo_name} does not exist, cloning it now.")
-                get_repo(repo_url)
-            else:
-                print(f"Repo {repo_name} does not exist and no repoURL provided to clone.")
-                return []
+        # The workspace reuses the checkout if it is already on disk
+        repo_dir = workspace.checkout(f'https://github.com/{repo_name}')
 
     else:
-        repo_dir = './improved_repos/' + repo_name
+        repo_dir = workspace.improved_path(repo_name)
 
     # Iterate through all Python files in the repository directory
     for root, dirs, files in os.walk(repo_dir):
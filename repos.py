@@ -1,10 +1,132 @@
-from utils import check_github_api_credentials
 import sys
+import os
+import json
+import math
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date, timedelta
 import pandas as pd
 import requests
 import tiktoken
 import base64
 
+GITHUB_API_URL = "https://api.github.com"
+# The search API never returns more than 1000 results for a single query
+SEARCH_RESULT_LIMIT = 1000
+PER_PAGE = 100
+MAX_ERROR_RETRIES = 5
+MAX_RATE_LIMIT_RETRIES = 10
+# Shortest wait after a rate limit response, even if its reset time already passed (e.g. clock skew)
+MIN_RATE_LIMIT_WAIT = 5
+MAX_PAGE_ATTEMPTS = 3
+
+
+# Class to track the rate limit of one GitHub API resource ("core" or "search") across threads
+class RateLimiter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.remaining = None  # Unknown until the first response arrives
+        self.reset = 0.0
+
+    # Reserve one request, sleeping until the quota resets if it is used up
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.time()
+                if self.remaining is not None and self.remaining <= 0 and now >= self.reset:
+                    # The window has reset, the next response tells us the new quota
+                    self.remaining = None
+                if self.remaining is None or self.remaining > 0:
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    return
+                wait_seconds = self.reset - now
+            print(f"Rate-Limit erreicht, warte {wait_seconds:.0f}s bis zum Reset.")
+            # The reset timestamp has a granularity of one second
+            time.sleep(wait_seconds + 1)
+
+    # Update the quota from the X-RateLimit-* headers of a response
+    def update(self, headers):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining, reset = int(remaining), float(reset)
+        except ValueError:
+            return
+        with self.lock:
+            if reset > self.reset:
+                self.remaining, self.reset = remaining, reset
+            elif reset == self.reset:
+                # Responses can arrive out of order, the lowest value is the most recent one
+                self.remaining = remaining if self.remaining is None else min(self.remaining, remaining)
+
+    # Block all requests until the given timestamp, but at least for MIN_RATE_LIMIT_WAIT seconds
+    def block_until(self, timestamp):
+        with self.lock:
+            self.remaining = 0
+            self.reset = max(self.reset, timestamp, time.time() + MIN_RATE_LIMIT_WAIT)
+
+
+rate_limiters = {"core": RateLimiter(), "search": RateLimiter()}
+
+
+# Function to get the timestamp until which a rate limited response asks us to wait.
+# Retry-After may be given in seconds or as an HTTP date, unparsable values wait one minute.
+def rate_limit_reset(headers):
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return time.time() + int(retry_after)
+        except ValueError:
+            pass
+        try:
+            return parsedate_to_datetime(retry_after).timestamp()
+        except (TypeError, ValueError):
+            return time.time() + 60
+    try:
+        return float(headers["X-RateLimit-Reset"])
+    except (KeyError, ValueError):
+        return time.time() + 60
+
+
+# Function to perform a GET request against the GitHub API that waits for rate limit resets
+# instead of failing. Returns None if the request keeps failing.
+def github_get(url, github_token, params=None):
+    limiter = rate_limiters["search" if "/search/" in url else "core"]
+    headers = {"Authorization": f"token {github_token}"} if github_token else {}
+    errors = 0
+    rate_limited = 0
+    while errors < MAX_ERROR_RETRIES and rate_limited < MAX_RATE_LIMIT_RETRIES:
+        limiter.acquire()
+        try:
+            response = requests.get(url, headers=headers, params=params, timeout=30)
+        except requests.RequestException as e:
+            errors += 1
+            print(f"Netzwerkfehler bei {url}: {e}")
+            time.sleep(2 ** errors)
+            continue
+
+        limiter.update(response.headers)
+        if response.status_code in (403, 429) and (
+                response.headers.get("Retry-After") or response.headers.get("X-RateLimit-Remaining") == "0"):
+            # Primary rate limit (quota used up) or secondary rate limit (Retry-After)
+            rate_limited += 1
+            limiter.block_until(rate_limit_reset(response.headers))
+            continue
+        if response.status_code >= 500:
+            errors += 1
+            print(f"Fehlercode {response.status_code} bei {url}, neuer Versuch {errors}/{MAX_ERROR_RETRIES}")
+            time.sleep(2 ** errors)
+            continue
+        return response
+    print(f"Abbruch nach {errors} Fehlern und {rate_limited} Rate-Limits bei {url}")
+    return None
+
+
 # Function to count the number of tokens in a string using tiktoken
 def num_tokens_from_string(string: str, encoding_name: str) -> int:
     encoding = tiktoken.encoding_for_model(encoding_name)
@@ -12,104 +134,258 @@ def num_tokens_from_string(string: str, encoding_name: str) -> int:
     return num_tokens
 
 # Function to fetch the default branch of a GitHub repository
-def get_default_branch(repo_full_name, github_token):
-    api_url = f"https://api.github.com/repos/{repo_full_name}"
-    headers = {"Authorization": f"token {github_token}"}
-    response = requests.get(api_url, headers=headers)
-    if response.status_code == 200:
+def get_default_branch(repo_full_name, github_token, api_url=GITHUB_API_URL):
+    response = github_get(f"{api_url}/repos/{repo_full_name}", github_token)
+    if response is not None and response.status_code == 200:
         return response.json().get("default_branch", "main")
     else:
         print(f"Problem beim Abrufen des Standardbranches von {repo_full_name}")
         return "main"
 
 # Function to get the content of a specific file in a GitHub repository
-def get_file_content(repo_full_name, filename, github_token):
-    api_url = f"https://api.github.com/repos/{repo_full_name}/contents/{filename}"
-    headers = {"Authorization": f"token {github_token}"}
-    response = requests.get(api_url, headers=headers)
+def get_file_content(repo_full_name, filename, github_token, api_url=GITHUB_API_URL):
+    response = github_get(f"{api_url}/repos/{repo_full_name}/contents/{filename}", github_token)
+    if response is None or response.status_code != 200:
+        return None
     try:
         content_decoded = base64.b64decode(response.json()["content"]).decode("utf-8")
     except UnicodeDecodeError:
         return 'x' * 10000
-    if response.status_code == 200:
-        return content_decoded
-    else:
-        return None
+    return content_decoded
 
-# Function to count the number of Python tokens in a GitHub repository
-def count_python_tokens(repo_full_name, github_token, max_tokens):
-    default_branch = get_default_branch(repo_full_name, github_token)
-    api_url = f"https://api.github.com/repos/{repo_full_name}/git/trees/{default_branch}?recursive=1"
-    headers = {"Authorization": f"token {github_token}"}
-    response = requests.get(api_url, headers=headers)
-    if response.status_code == 200:
+# Function to check if the Python code of a GitHub repository stays within max_tokens.
+# Returns None if the check could not be completed because an API request failed.
+def count_python_tokens(repo_full_name, github_token, max_tokens, api_url=GITHUB_API_URL):
+    default_branch = get_default_branch(repo_full_name, github_token, api_url)
+    response = github_get(f"{api_url}/repos/{repo_full_name}/git/trees/{default_branch}?recursive=1",
+                          github_token)
+    if response is not None and response.status_code == 200:
         tree = response.json()["tree"]
         total_tokens = 0
         for item in tree:
             if item["path"].endswith(".py"):
-                file_content = get_file_content(repo_full_name, item["path"], github_token)
-                if file_content:
-                    total_tokens += num_tokens_from_string(file_content, "gpt-3.5-turbo")
+                file_content = get_file_content(repo_full_name, item["path"], github_token, api_url)
+                if file_content is None:
+                    # Skipping the file would undercount the tokens
+                    print(f"Problem beim Abrufen von {item['path']} aus {repo_full_name}")
+                    return None
+                total_tokens += num_tokens_from_string(file_content, "gpt-3.5-turbo")
+                # No need to download the rest once the limit is exceeded
+                if total_tokens > int(max_tokens):
+                    return False
         return total_tokens <= int(max_tokens)
     else:
         print(f"Problem beim Abrufen des Inhalts von {repo_full_name}")
-        return False
+        return None
 
-# Main function to search for GitHub repositories based on various criteria
-def search_repositories(language, num_repos, year, max_tokens, query_terms, github_token):
-    num_repos = int(num_repos)
-    api_url = "https://api.github.com/search/repositories"
-    query = f"language:{language} created:{year} {query_terms}"
 
+# Function to parse the creation date range, either a year ("2022") or a range ("2022-01-01..2022-06-30")
+def parse_date_range(year):
+    year = str(year)
+    if ".." in year:
+        start, end = year.split("..")
+        return date.fromisoformat(start), date.fromisoformat(end)
+    return date(int(year), 1, 1), date(int(year), 12, 31)
+
+# Function to split a date range into `count` consecutive windows of roughly equal length
+def split_date_range(start, end, count):
+    days = (end - start).days + 1
+    count = max(1, min(count, days))
+    windows = []
+    for i in range(count):
+        window_start = start + timedelta(days=days * i // count)
+        window_end = start + timedelta(days=days * (i + 1) // count - 1)
+        windows.append(window_key(window_start, window_end))
+    return windows
+
+def window_key(start, end):
+    return f"{start.isoformat()}..{end.isoformat()}"
+
+def parse_window_key(key):
+    start, end = key.split("..")
+    return date.fromisoformat(start), date.fromisoformat(end)
+
+# Function to fetch one page of search results for a creation date window
+def fetch_search_page(api_url, base_query, window, page, github_token):
     params = {
-        "q": query,
+        "q": f"{base_query} created:{window}",
         "sort": "stars",
         "order": "asc",
-        "per_page": 100,
+        "per_page": PER_PAGE,
+        "page": page,
     }
-    headers = {"Authorization": f"token {github_token}"}
-    filtered_repos = []
-    page_num = 1
-
-    while len(filtered_repos) < num_repos:
-        params["page"] = page_num
-        response = requests.get(api_url, headers=headers, params=params)
-        if response.status_code != 200:
-            print(f"Fehlercode: {response.status_code}")
-            print("Es gab ein Problem beim Abrufen der Repositories.")
-            return None
-
-        repos = response.json()["items"]
-        if not repos:
-            break
-
-        for repo in repos:
-            if len(filtered_repos) >= num_repos:
-                break
-            py_files_count = count_python_tokens(repo["full_name"], github_token, max_tokens)
-            if py_files_count:
-                filtered_repos.append(repo)
-
-        page_num += 1
-
-    df = pd.DataFrame([repo["html_url"] for repo in filtered_repos], columns=["Repository URL"])
-    df.to_csv("repositories.csv", index=False)
-
-    print("Die Repositories wurden erfolgreich in der Datei 'repositories.csv' gespeichert.")
+    response = github_get(f"{api_url}/search/repositories", github_token, params=params)
+    if response is None or response.status_code != 200:
+        status = "keine Antwort" if response is None else response.status_code
+        print(f"Problem beim Abrufen von Seite {page} für {window} ({status}).")
+        return None
+    return response.json()
+
+
+# Function to load the discovery cursor, or start a new one if it belongs to a different search.
+# A search is identified by its query, its date range and the token limit the candidates were checked with.
+def load_cursor(cursor_path, search):
+    if cursor_path and os.path.exists(cursor_path):
+        with open(cursor_path, "r", encoding="utf-8") as f:
+            cursor = json.load(f)
+        if cursor.get("search") == search:
+            print(f"Setze die Suche mit dem Cursor '{cursor_path}' fort.")
+            return cursor
+        print(f"Der Cursor '{cursor_path}' gehört zu einer anderen Suche und wird ersetzt.")
+    return {"search": search, "windows": {}, "candidates": {}, "checked": {}}
+
+# Function to remove the cursor of a finished search, so a later search starts fresh
+def remove_cursor(cursor_path):
+    if cursor_path and os.path.exists(cursor_path):
+        os.remove(cursor_path)
+
+# Function to atomically write the discovery cursor
+def save_cursor(cursor_path, cursor):
+    if not cursor_path:
+        return
+    tmp_path = cursor_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cursor, f)
+    os.replace(tmp_path, cursor_path)
+
+
+# Function to collect candidate repositories from all date windows of the search.
+# Windows with more results than the search API returns are split in half until they fit,
+# pages are fetched concurrently and the progress is stored in the cursor after every page.
+# Failed pages are retried up to MAX_PAGE_ATTEMPTS times, the pages that still failed are returned.
+def discover_candidates(cursor, cursor_path, base_query, date_range, github_token, api_url,
+                        max_workers, max_candidates):
+    windows = cursor["windows"]
+    if not windows:
+        for key in split_date_range(*date_range, max_workers):
+            windows[key] = {"total_count": None, "split": False, "pages_done": []}
+
+    # Function to list the pages that still have to be fetched for a window
+    def pending_pages(state):
+        if state["split"]:
+            return []
+        if state["total_count"] is None:
+            return [1]
+        page_count = math.ceil(min(state["total_count"], SEARCH_RESULT_LIMIT) / PER_PAGE)
+        return [page for page in range(1, page_count + 1) if page not in state["pages_done"]]
+
+    queue = [(key, page) for key, state in windows.items() for page in pending_pages(state)]
+    attempts = {}
+    skipped = []
+
+    def enough():
+        return max_candidates is not None and len(cursor["candidates"]) >= max_candidates
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while (queue and not enough()) or running:
+            while queue and len(running) < max_workers and not enough():
+                key, page = queue.pop(0)
+                future = executor.submit(fetch_search_page, api_url, base_query, key, page, github_token)
+                running[future] = (key, page)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, page = running.pop(future)
+                result = future.result()
+                if result is None:
+                    attempts[(key, page)] = attempts.get((key, page), 0) + 1
+                    if attempts[(key, page)] < MAX_PAGE_ATTEMPTS:
+                        queue.append((key, page))
+                    else:
+                        skipped.append((key, page))
+                    continue
+                state = windows[key]
+
+                for repo in result.get("items", []):
+                    cursor["candidates"].setdefault(repo["full_name"], {
+                        "html_url": repo["html_url"],
+                        "stars": repo.get("stargazers_count", 0),
+                    })
+                state["pages_done"].append(page)
+
+                if state["total_count"] is None:
+                    state["total_count"] = result.get("total_count", 0)
+                    start, end = parse_window_key(key)
+                    if state["total_count"] > SEARCH_RESULT_LIMIT and start < end:
+                        # Too many results for one query, split the window in half
+                        state["split"] = True
+                        middle = start + (end - start) // 2
+                        for half in (window_key(start, middle), window_key(middle + timedelta(days=1), end)):
+                            windows[half] = {"total_count": None, "split": False, "pages_done": []}
+                            queue.append((half, 1))
+                    else:
+                        if state["total_count"] > SEARCH_RESULT_LIMIT:
+                            print(f"Das Fenster {key} hat {state['total_count']} Treffer, "
+                                  f"nur die ersten {SEARCH_RESULT_LIMIT} sind abrufbar.")
+                        queue.extend((key, next_page) for next_page in pending_pages(state))
+
+                save_cursor(cursor_path, cursor)
+
+    print(f"{len(cursor['candidates'])} Kandidaten gefunden.")
+    if skipped:
+        print(f"{len(skipped)} Seiten konnten nach {MAX_PAGE_ATTEMPTS} Versuchen nicht abgerufen werden, "
+              f"die Ergebnisse sind unvollständig:")
+        for key, page in sorted(skipped):
+            print(f"  Fenster {key}, Seite {page}")
+    return skipped
+
+
+# Main function to search for GitHub repositories based on various criteria
+def search_repositories(language, num_repos, year, max_tokens, query_terms, github_token,
+                        output_path="repositories.csv", api_url=GITHUB_API_URL, max_workers=8,
+                        max_candidates=None, cursor_path=None):
+    num_repos = int(num_repos)
+    base_query = f"language:{language} {query_terms}".strip()
+    date_range = parse_date_range(year)
+
+    search = {"query": base_query, "date_range": window_key(*date_range), "max_tokens": int(max_tokens)}
+
+    cursor = load_cursor(cursor_path, search)
+    skipped = discover_candidates(cursor, cursor_path, base_query, date_range, github_token, api_url,
+                                  max_workers, max_candidates)
+
+    # Check the candidates with the fewest stars first, like the original single query did
+    candidates = sorted(cursor["candidates"].items(), key=lambda item: (item[1]["stars"], item[0]))
+    checked = cursor["checked"]
+    filtered_repos = [name for name, _ in candidates if checked.get(name)]
+    unchecked = [name for name, _ in candidates if name not in checked]
+
+    failed_checks = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(filtered_repos) < num_repos and unchecked:
+            batch, unchecked = unchecked[:max_workers], unchecked[max_workers:]
+            results = executor.map(lambda name: count_python_tokens(name, github_token, max_tokens, api_url),
+                                   batch)
+            for name, accepted in zip(batch, results):
+                if accepted is None:
+                    # Not stored in the cursor, so a resumed search checks the repository again
+                    failed_checks += 1
+                    continue
+                checked[name] = accepted
+                if accepted:
+                    filtered_repos.append(name)
+            save_cursor(cursor_path, cursor)
+
+    # Keep the star order of the candidates in the output
+    accepted_names = set(filtered_repos)
+    urls = [info["html_url"] for name, info in candidates if name in accepted_names][:num_repos]
+    df = pd.DataFrame(urls, columns=["Repository URL"])
+    df.to_csv(output_path, index=False)
+
+    print(f"Die Repositories wurden erfolgreich in der Datei '{output_path}' gespeichert.")
+    if failed_checks:
+        print(f"{failed_checks} Repositories konnten nicht geprüft werden, "
+              f"sie werden beim nächsten Lauf erneut geprüft.")
+    if skipped or failed_checks:
+        # Keep the cursor, running the same search again only fetches the missing pages
+        print(f"Der Cursor '{cursor_path}' bleibt erhalten, um die fehlenden Seiten und Prüfungen nachzuholen.")
+    else:
+        remove_cursor(cursor_path)
     return df
 
-# Entry point of the script
+# Entry point of the script, equivalent to "python cli.py discover"
 if __name__ == "__main__":
-    if not check_github_api_credentials("https://api.github.com", ""):
-        sys.exit()
-
-    # Initialize parameters
-    language = "Python"
-    num_repos = '10'
-    max_tokens = '5000'
-    year = '2022'
-    search_terms = ['test', 'example']
-    query_terms = " OR ".join(search_terms)
-
-    df = search_repositories(language, num_repos, year, max_tokens, query_terms, "")
-    print(df)
+    from cli import main
+
+    sys.exit(main(["discover", *sys.argv[1:]]))
@@ -0,0 +1,65 @@
+import argparse
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+import cli
+
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.repositories_df = pd.DataFrame({"Repository URL": [f"https://github.com/user/repo{i}" for i in range(200)]})
+
+    def test_parse_shard(self):
+        self.assertEqual(cli.parse_shard("1/4"), (1, 4))
+        for value in ["4/4", "1/0", "a/b", "-1/4", "1"]:
+            with self.assertRaises(argparse.ArgumentTypeError, msg=value):
+                cli.parse_shard(value)
+
+    def test_shards_are_disjoint_and_cover_the_list(self):
+        count = 4
+        shards = [set(cli.select_shard(self.repositories_df, (index, count))["Repository URL"])
+                  for index in range(count)]
+
+        self.assertEqual(sum(len(shard) for shard in shards), len(self.repositories_df))
+        self.assertEqual(set.union(*shards), set(self.repositories_df["Repository URL"]))
+        self.assertTrue(all(shards), "every shard should get some repositories")
+
+    def test_shards_do_not_depend_on_row_order(self):
+        reversed_df = self.repositories_df.iloc[::-1]
+        self.assertEqual(set(cli.select_shard(self.repositories_df, (2, 4))["Repository URL"]),
+                         set(cli.select_shard(reversed_df, (2, 4))["Repository URL"]))
+
+    def test_shard_output_path(self):
+        self.assertEqual(cli.shard_output_path("rates.csv", (0, 4)), "rates.shard-0-of-4.csv")
+        self.assertEqual(cli.shard_output_path("rates.csv", None), "rates.csv")
+
+
+class TestMerge(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def write(self, name, rows):
+        path = os.path.join(self.temp_dir.name, name)
+        pd.DataFrame(rows, columns=["Repository URL", "Semantic Rating"]).to_csv(path, index=False)
+        return path
+
+    def test_merge_removes_duplicates_and_restores_order(self):
+        order = self.write("repositories.csv", [("u/a", None), ("u/b", None), ("u/c", None)])
+        first = self.write("first.csv", [("u/c", 0.1), ("u/a", 0.2)])
+        second = self.write("second.csv", [("u/a", 0.9), ("u/b", 0.3)])
+        output = os.path.join(self.temp_dir.name, "merged.csv")
+
+        cli.main(["merge", first, second, "--output", output, "--order", order])
+
+        merged_df = pd.read_csv(output)
+        self.assertEqual(merged_df["Repository URL"].tolist(), ["u/a", "u/b", "u/c"])
+        # The file given last wins
+        self.assertEqual(merged_df["Semantic Rating"].tolist(), [0.9, 0.3, 0.1])
+
+
+if __name__ == "__main__":
+    unittest.main()
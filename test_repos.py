@@ -0,0 +1,239 @@
+import os
+import re
+import tempfile
+import threading
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+
+import repos
+
+
+# Response of the mocked GitHub API
+class MockResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+
+# Clock whose sleep() advances the time instead of blocking, so rate limit waits are instant
+class MockClock:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.now = 1_700_000_000.0
+        self.sleeps = []
+
+    def time(self):
+        with self.lock:
+            return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.sleeps.append(seconds)
+            self.now += max(seconds, 0)
+
+
+# Local mock of the /search/repositories endpoint, the repositories are spread evenly over 2022
+class MockSearchApi:
+    def __init__(self, repo_count=2500, year=2022):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.failures = {}  # created window -> number of requests for page 1 that fail with a 422
+        first_day = date(year, 1, 1)
+        self.repos = [{
+            "full_name": f"user/repo{i}",
+            "html_url": f"https://github.com/user/repo{i}",
+            "stargazers_count": i % 50,
+            "created": first_day + timedelta(days=i % 365),
+        } for i in range(repo_count)]
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        start, end = (date.fromisoformat(part) for part in
+                      re.search(r"created:(\S+)\.\.(\S+)", params["q"]).groups())
+        window, page = f"{start}..{end}", params["page"]
+        with self.lock:
+            self.calls.append((window, page))
+            if page == 1 and self.failures.get(window, 0) > 0:
+                self.failures[window] -= 1
+                return MockResponse(422)
+        if page * params["per_page"] > repos.SEARCH_RESULT_LIMIT:
+            return MockResponse(422)
+        matches = sorted((repo for repo in self.repos if start <= repo["created"] <= end),
+                         key=lambda repo: repo["stargazers_count"])
+        per_page = params["per_page"]
+        items = [{key: value for key, value in repo.items() if key != "created"}
+                 for repo in matches[(page - 1) * per_page: page * per_page]]
+        return MockResponse(200, {"total_count": len(matches), "items": items})
+
+
+class TestDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.clock = MockClock()
+        self.api = MockSearchApi()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cursor_path = os.path.join(self.temp_dir.name, "cursor.json")
+        for patcher in [
+            mock.patch.object(repos, "time", self.clock),
+            mock.patch.object(repos.requests, "get", self.api.get),
+            mock.patch.object(repos, "rate_limiters", {"core": repos.RateLimiter(), "search": repos.RateLimiter()}),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def discover(self, cursor, max_candidates=None):
+        return repos.discover_candidates(cursor, self.cursor_path, "language:Python", repos.parse_date_range("2022"),
+                                         "", repos.GITHUB_API_URL, 1, max_candidates)
+
+    def test_windows_above_search_limit_are_split(self):
+        cursor = repos.load_cursor(None, {})
+        skipped = self.discover(cursor)
+
+        self.assertEqual(skipped, [])
+        self.assertEqual(len(cursor["candidates"]), 2500)
+        self.assertTrue(cursor["windows"]["2022-01-01..2022-12-31"]["split"])
+        for key, state in cursor["windows"].items():
+            if not state["split"]:
+                self.assertLessEqual(state["total_count"], repos.SEARCH_RESULT_LIMIT, key)
+
+    def test_resume_only_fetches_missing_pages(self):
+        search = {"query": "language:Python"}
+        self.discover(repos.load_cursor(self.cursor_path, search), max_candidates=300)
+        first_calls = list(self.api.calls)
+
+        cursor = repos.load_cursor(self.cursor_path, search)
+        self.discover(cursor)
+
+        self.assertEqual(len(cursor["candidates"]), 2500)
+        # No page is requested twice across both runs
+        self.assertEqual(len(set(self.api.calls)), len(self.api.calls))
+        self.assertLess(len(first_calls), len(self.api.calls))
+
+    def test_failed_pages_are_retried_and_reported(self):
+        self.api.failures = {"2022-01-01..2022-12-31": 1}
+        cursor = repos.load_cursor(None, {})
+        self.assertEqual(self.discover(cursor), [])
+        self.assertEqual(len(cursor["candidates"]), 2500)
+
+        self.api.failures = {"2022-01-01..2022-12-31": repos.MAX_PAGE_ATTEMPTS}
+        cursor = repos.load_cursor(None, {})
+        self.assertEqual(self.discover(cursor), [("2022-01-01..2022-12-31", 1)])
+        self.assertEqual(cursor["candidates"], {})
+
+    def test_cursor_belongs_to_date_range_and_token_limit(self):
+        self.api.repos += [{**repo, "full_name": repo["full_name"] + "-2023",
+                            "html_url": repo["html_url"] + "-2023",
+                            "created": repo["created"].replace(year=2023)} for repo in self.api.repos]
+
+        with mock.patch.object(repos, "count_python_tokens", return_value=True) as count_tokens, \
+                mock.patch.object(repos.pd.DataFrame, "to_csv"):
+            # Leave the cursor of a finished 2022 search behind
+            with mock.patch.object(repos, "remove_cursor"):
+                df_2022 = repos.search_repositories("Python", 5, "2022", 5000, "", "", max_workers=1,
+                                                    cursor_path=self.cursor_path)
+            self.assertTrue(os.path.exists(self.cursor_path))
+
+            df_2023 = repos.search_repositories("Python", 5, "2023", 5000, "", "", max_workers=1,
+                                                cursor_path=self.cursor_path)
+            # A finished search removes its cursor
+            self.assertFalse(os.path.exists(self.cursor_path))
+
+            # Candidates checked with a different token limit are checked again
+            with mock.patch.object(repos, "remove_cursor"):
+                repos.search_repositories("Python", 5, "2023", 5000, "", "", max_workers=1,
+                                          cursor_path=self.cursor_path)
+            count_tokens.reset_mock()
+            repos.search_repositories("Python", 5, "2023", 100, "", "", max_workers=1,
+                                      cursor_path=self.cursor_path)
+            self.assertTrue(count_tokens.called)
+
+        self.assertTrue(all(not url.endswith("-2023") for url in df_2022["Repository URL"]))
+        self.assertTrue(all(url.endswith("-2023") for url in df_2023["Repository URL"]))
+
+
+class TestTokenCheck(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cursor_path = os.path.join(self.temp_dir.name, "cursor.json")
+        for patcher in [
+            mock.patch.object(repos, "num_tokens_from_string", lambda string, encoding: len(string.split())),
+            mock.patch.object(repos, "get_default_branch", return_value="main"),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, file_status):
+        # Tree with two Python files, the second one can fail
+        def get(url, github_token, params=None):
+            if "/git/trees/" in url:
+                return MockResponse(200, {"tree": [{"path": "a.py"}, {"path": "b.py"}]})
+            if url.endswith("b.py") and file_status != 200:
+                return None if file_status is None else MockResponse(file_status)
+            return MockResponse(200, {"content": repos.base64.b64encode(b"x = 1").decode()})
+        return get
+
+    def test_failed_file_fetch_fails_the_check(self):
+        with mock.patch.object(repos, "github_get", self.get(200)):
+            self.assertTrue(repos.count_python_tokens("user/repo", "", 100))
+        for status in [None, 404]:
+            with mock.patch.object(repos, "github_get", self.get(status)):
+                self.assertIsNone(repos.count_python_tokens("user/repo", "", 100))
+        with mock.patch.object(repos, "github_get", return_value=None):
+            self.assertIsNone(repos.count_python_tokens("user/repo", "", 100))
+
+    def test_failed_checks_are_retried_on_resume(self):
+        search = {"query": "language:Python", "date_range": "2022-01-01..2022-12-31", "max_tokens": 100}
+        cursor = repos.load_cursor(None, search)
+        cursor["candidates"] = {"user/repo": {"html_url": "https://github.com/user/repo", "stars": 0}}
+        repos.save_cursor(self.cursor_path, cursor)
+
+        with mock.patch.object(repos, "discover_candidates", return_value=[]), \
+                mock.patch.object(repos.pd.DataFrame, "to_csv"):
+            with mock.patch.object(repos, "count_python_tokens", return_value=None):
+                df = repos.search_repositories("Python", 1, "2022", 100, "", "", cursor_path=self.cursor_path)
+            self.assertTrue(df.empty)
+            # The cursor is kept without a verdict for the repository
+            self.assertEqual(repos.load_cursor(self.cursor_path, search)["checked"], {})
+
+            with mock.patch.object(repos, "count_python_tokens", return_value=True):
+                df = repos.search_repositories("Python", 1, "2022", 100, "", "", cursor_path=self.cursor_path)
+            self.assertEqual(df["Repository URL"].tolist(), ["https://github.com/user/repo"])
+
+
+class TestRateLimit(unittest.TestCase):
+    def setUp(self):
+        self.clock = MockClock()
+        for patcher in [
+            mock.patch.object(repos, "time", self.clock),
+            mock.patch.object(repos, "rate_limiters", {"core": repos.RateLimiter(), "search": repos.RateLimiter()}),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_rate_limit_sleeps_and_retries(self):
+        # The reset time lies in the past, as it does with clock skew
+        limited = MockResponse(403, headers={"X-RateLimit-Remaining": "0",
+                                             "X-RateLimit-Reset": str(int(self.clock.now) - 100)})
+        with mock.patch.object(repos.requests, "get", side_effect=[limited, MockResponse(200)]) as get:
+            response = repos.github_get("https://api.github.com/search/repositories", "")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get.call_count, 2)
+        self.assertGreaterEqual(sum(self.clock.sleeps), repos.MIN_RATE_LIMIT_WAIT)
+
+    def test_rate_limit_retries_are_bounded(self):
+        limited = MockResponse(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        with mock.patch.object(repos.requests, "get", return_value=limited) as get:
+            response = repos.github_get("https://api.github.com/search/repositories", "")
+
+        self.assertIsNone(response)
+        self.assertEqual(get.call_count, repos.MAX_RATE_LIMIT_RETRIES)
+
+
+if __name__ == "__main__":
+    unittest.main()
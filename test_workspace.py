@@ -0,0 +1,141 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import workspace
+from workspace import Workspace, CHECKOUT, IMPROVED
+
+
+# Fake of Repo.clone_from that writes a file of a fixed size instead of cloning
+class FakeClone:
+    def __init__(self, size=1000):
+        self.size = size
+        self.calls = []
+
+    def __call__(self, repo_url, repo_path):
+        self.calls.append(repo_url)
+        os.makedirs(repo_path)
+        with open(os.path.join(repo_path, "code.py"), "w") as f:
+            f.write("x" * self.size)
+
+
+def url(name):
+    return f"https://github.com/user/{name}"
+
+
+class TestWorkspace(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.clone = FakeClone()
+        patcher = mock.patch.object(workspace.Repo, "clone_from", self.clone)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def workspace(self, **kwargs):
+        return Workspace(checkout_dir=os.path.join(self.temp_dir.name, "repos"),
+                         improved_dir=os.path.join(self.temp_dir.name, "improved_repos"), **kwargs)
+
+    def checkouts(self, ws):
+        return sorted(name for kind, name in ws.entries if kind == CHECKOUT)
+
+    def test_evicts_least_recently_used_first(self):
+        ws = self.workspace(quota_bytes=2500)
+        for name in ["a", "b"]:
+            ws.acquire(url(name))
+            ws.release(url(name))
+        # Using "a" again makes "b" the least recently used checkout
+        ws.acquire(url("a"))
+        ws.release(url("a"))
+        ws.acquire(url("c"))
+        ws.release(url("c"))
+
+        self.assertEqual(self.checkouts(ws), ["user/a", "user/c"])
+        self.assertFalse(os.path.exists(ws.path(CHECKOUT, "user/b")))
+
+    def test_referenced_entries_are_never_evicted(self):
+        ws = self.workspace(quota_bytes=1500)
+        held = ws.acquire(url("a"))
+        ws.acquire(url("b"))
+        ws.release(url("b"))
+
+        self.assertTrue(os.path.exists(held))
+        self.assertEqual(self.checkouts(ws), ["user/a"])
+
+    def test_new_checkout_above_quota_is_not_evicted_right_away(self):
+        self.clone.size = 5000
+        ws = self.workspace(quota_bytes=1000)
+        self.assertTrue(os.path.exists(ws.checkout(url("a"))))
+
+    def test_reuse_and_clone_stats(self):
+        ws = self.workspace()
+        for _ in range(3):
+            ws.acquire(url("a"))
+            ws.release(url("a"))
+
+        self.assertEqual(self.clone.calls, [url("a")])
+        self.assertEqual(ws.stats["cloned"], 1)
+        self.assertEqual(ws.stats["cloned_bytes"], 1000)
+        self.assertEqual(ws.stats["reused"], 2)
+        self.assertEqual(ws.stats["reused_bytes"], 2000)
+
+        # A new workspace on the same directory reuses the checkout of the earlier run
+        ws = self.workspace()
+        ws.acquire(url("a"))
+        self.assertEqual(len(self.clone.calls), 1)
+        self.assertEqual(ws.stats["reused"], 1)
+
+    def write_improved(self, ws, name, size=1000):
+        improved_path = ws.acquire_improved(url(name))
+        with open(os.path.join(improved_path, "code.py"), "w") as f:
+            f.write("x" * size)
+        ws.release_improved(url(name))
+
+    def test_improved_outputs_are_evicted_by_default(self):
+        ws = self.workspace(quota_bytes=1500)
+        self.write_improved(ws, "a")
+        self.write_improved(ws, "b")
+
+        self.assertFalse(os.path.exists(ws.improved_path(url("a"))))
+        self.assertTrue(os.path.exists(ws.improved_path(url("b"))))
+
+    def test_keep_improved(self):
+        ws = self.workspace(quota_bytes=1500, keep_improved=True)
+        with mock.patch("builtins.print") as output:
+            self.write_improved(ws, "a")
+            self.write_improved(ws, "b")
+
+        self.assertTrue(os.path.exists(ws.improved_path(url("a"))))
+        self.assertTrue(os.path.exists(ws.improved_path(url("b"))))
+        self.assertTrue(any("exceed the disk quota" in str(call) for call in output.call_args_list))
+        self.assertEqual(ws.used_bytes([IMPROVED]), 2000)
+
+    def test_checkouts_of_other_processes_are_not_evicted(self):
+        ws = self.workspace(quota_bytes=1500)
+        other = self.workspace(quota_bytes=1500)
+        # Another process clones and holds "a" after this workspace was created
+        other_path = other.acquire(url("a"))
+
+        self.assertEqual(ws.acquire(url("a")), other_path)
+        ws.release(url("a"))
+        ws.acquire(url("b"))
+        ws.release(url("b"))
+
+        self.assertEqual(len(self.clone.calls), 2)
+        self.assertTrue(os.path.exists(other_path))
+
+    def test_tmpfs_is_removed_on_close(self):
+        ws = Workspace(improved_dir=os.path.join(self.temp_dir.name, "improved_repos"), use_tmpfs=True)
+        checkout_path = ws.checkout(url("a"))
+        self.write_improved(ws, "a")
+        ws.close()
+
+        self.assertFalse(os.path.exists(checkout_path))
+        self.assertFalse(os.path.exists(ws.temp_root or os.path.dirname(os.path.dirname(checkout_path))))
+        # The improved outputs are not part of the temporary directory
+        self.assertTrue(os.path.exists(ws.improved_path(url("a"))))
+
+
+if __name__ == "__main__":
+    unittest.main()
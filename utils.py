@@ -3,28 +3,11 @@ from github import Github
 import requests
 import openai
 import os
-import shutil
-from git import Repo
+from workspace import get_workspace, CHECKOUT
 
-# Function to clone a GitHub repository to a local directory
+# Function to get the local checkout of a GitHub repository, cloning it only if needed
 def get_repo(repoURL):
-    name = repoURL.split("/")
-    repo_path = "./repos/" + name[-2] + "/" + name[-1]
-
-    # Create 'repos' folder if it doesn't exist
-    if not os.path.exists("./repos/"):
-        print("Creating repos folder")
-        os.makedirs("./repos/")
-
-    # Check if the repo is already cloned
-    if os.path.exists(repo_path):
-        print(f"The repo {name[-1]} has already been cloned. Exiting.")
-        return str(repo_path)
-
-    # Clone the repository to the 'repos' folder
-    Repo.clone_from(repoURL, repo_path)
-    print(f"Cloned repo {name[-1]} to repos folder")
-    return str(repo_path)
+    return get_workspace().checkout(repoURL)
 
 # Function to validate the OpenAI API key
 def check_openai_key(api_key):
@@ -41,14 +24,7 @@ def clone_repo(repo_link, github_token):
     repo_name = "/".join(repo_link.split("/")[-2:])
     g = Github(github_token)
     repo = g.get_repo(repo_name)
-    repo_dir = os.path.abspath(f'./repos/{repo_name}')
-
-    # Check if the repo is already cloned
-    if os.path.exists(repo_dir):
-        print(f"Repository {repo_name} already exists. Using existing repo.")
-    else:
-        print(f"Cloning repository {repo_name}.")
-        Repo.clone_from(repo_link, repo_dir)
+    repo_dir = get_workspace().checkout(repo_link)
 
     # List all Python files in the repository
     python_files = glob.glob(os.path.join(repo_dir, '**/*.py'), recursive=True)
@@ -57,10 +33,10 @@ def clone_repo(repo_link, github_token):
 # Function to delete a cloned GitHub repository from the local machine
 def delete_repo(repo_link):
     repo_name = "/".join(repo_link.split("/")[-2:])
-    repo_dir = os.path.abspath(f'./repos/{repo_name}')
+    repo_dir = get_workspace().path(CHECKOUT, repo_name)
 
     if os.path.exists(repo_dir):
-        shutil.rmtree(repo_dir)
+        get_workspace().remove(repo_link)
         print(f"Repository {repo_name} deleted.")
     else:
         print(f"Repository {repo_name} does not exist.")
@@ -0,0 +1,252 @@
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from git import Repo
+
+CHECKOUT = "checkout"
+IMPROVED = "improved"
+
+
+# Function to parse a disk size like "500M", "2G" or "1048576" into bytes
+def parse_size(value):
+    if value is None:
+        return None
+    value = str(value).strip().upper()
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+# Function to format a number of bytes for the report
+def format_size(num_bytes):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TB"
+
+# Function to calculate the size of a directory on disk
+def directory_size(path):
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for file in filenames:
+            file_path = os.path.join(dirpath, file)
+            if not os.path.islink(file_path):
+                total += os.path.getsize(file_path)
+    return total
+
+# Function to get the "owner/name" part of a GitHub URL or path
+def repo_name_from_url(repo_url):
+    return "/".join(repo_url.rstrip("/").split("/")[-2:])
+
+
+# Class to manage the cloned repositories and improved outputs of a run.
+# Checkouts are kept on disk between the pipeline stages and reused instead of cloned again.
+# Entries that are in use are reference counted, all other entries are evicted in
+# least-recently-used order as soon as they grow beyond the disk quota. Improved outputs are
+# evicted the same way once their rating is saved, unless keep_improved is set.
+# Reference counts only exist within one process, so the directories must not be shared by
+# processes running at the same time. Directories that appear while the workspace is in use
+# (i.e. created by another process) are reused but never evicted.
+class Workspace:
+    def __init__(self, checkout_dir="./repos", improved_dir="./improved_repos", quota_bytes=None, use_tmpfs=False,
+                 keep_improved=False):
+        self.temp_root = None
+        if use_tmpfs:
+            # /dev/shm is a tmpfs on most Linux systems, fall back to the default temp dir otherwise.
+            # Only the checkouts go there, the improved outputs have to outlive the run.
+            shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+            self.temp_root = tempfile.mkdtemp(prefix="meaningful-names-", dir=shm)
+            checkout_dir = os.path.join(self.temp_root, "repos")
+
+        self.roots = {CHECKOUT: os.path.abspath(checkout_dir), IMPROVED: os.path.abspath(improved_dir)}
+        self.quota_bytes = quota_bytes
+        self.evictable = {CHECKOUT} if keep_improved else {CHECKOUT, IMPROVED}
+        self.warned_quota = False
+        # (kind, repo_name) -> {"size": bytes, "refs": count, "owned": bool}, ordered from least to most
+        # recently used. Only owned entries count towards the quota and can be evicted.
+        self.entries = OrderedDict()
+        self.stats = {"cloned_bytes": 0, "cloned": 0, "reused_bytes": 0, "reused": 0,
+                      "evicted_bytes": 0, "evicted": 0}
+        self.scan()
+
+    # Register the checkouts and improved outputs left on disk by earlier runs, oldest first
+    def scan(self):
+        found = []
+        for kind, root in self.roots.items():
+            if not os.path.isdir(root):
+                continue
+            for owner in os.listdir(root):
+                owner_dir = os.path.join(root, owner)
+                if not os.path.isdir(owner_dir):
+                    continue
+                for name in os.listdir(owner_dir):
+                    path = os.path.join(owner_dir, name)
+                    if os.path.isdir(path):
+                        found.append((os.path.getmtime(path), (kind, f"{owner}/{name}"), directory_size(path)))
+        for _, key, size in sorted(found):
+            self.entries[key] = {"size": size, "refs": 0, "owned": True}
+
+    def path(self, kind, repo_name):
+        return os.path.join(self.roots[kind], repo_name)
+
+    # Function to get the size of the owned entries of the given kinds
+    def used_bytes(self, kinds=(CHECKOUT, IMPROVED)):
+        return sum(entry["size"] for key, entry in self.entries.items() if key[0] in kinds and entry["owned"])
+
+    # Register a directory that is already on disk but unknown to the workspace
+    def register_existing(self, key):
+        # It was created after the scan, e.g. by another process, so it is not ours to delete
+        self.entries[key] = {"size": directory_size(self.path(*key)), "refs": 0, "owned": False}
+
+    # Mark an entry as most recently used
+    def touch(self, key):
+        self.entries.move_to_end(key)
+
+    # Function to get the local checkout of a repository, cloning it only if it is not on disk yet
+    def checkout(self, repo_url):
+        key = (CHECKOUT, repo_name_from_url(repo_url))
+        repo_path = self.path(*key)
+
+        if os.path.exists(repo_path):
+            if key not in self.entries:
+                self.register_existing(key)
+            self.touch(key)
+            return repo_path
+
+        print(f"Cloning repository {key[1]}.")
+        os.makedirs(os.path.dirname(repo_path), exist_ok=True)
+        Repo.clone_from(repo_url, repo_path)
+        size = directory_size(repo_path)
+        refs = self.entries[key]["refs"] if key in self.entries else 0
+        self.entries[key] = {"size": size, "refs": refs, "owned": True}
+        self.touch(key)
+        self.stats["cloned"] += 1
+        self.stats["cloned_bytes"] += size
+        # The caller is about to use the checkout, even if it does not hold a reference
+        self.enforce_quota(exclude=key)
+        return repo_path
+
+    # Function to take a reference on a checkout so it is not evicted while it is in use
+    def acquire(self, repo_url):
+        key = (CHECKOUT, repo_name_from_url(repo_url))
+        reused = os.path.exists(self.path(*key))
+        if key not in self.entries:
+            if reused:
+                self.register_existing(key)
+            else:
+                self.entries[key] = {"size": 0, "refs": 0, "owned": True}
+        self.entries[key]["refs"] += 1
+        try:
+            repo_path = self.checkout(repo_url)
+        except Exception:
+            self.release(repo_url)
+            raise
+        if reused:
+            self.stats["reused"] += 1
+            self.stats["reused_bytes"] += self.entries[key]["size"]
+        return repo_path
+
+    # Function to drop a reference on a checkout and evict entries if the quota is exceeded
+    def release(self, repo_url, kind=CHECKOUT):
+        key = (kind, repo_name_from_url(repo_url))
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        entry["refs"] = max(0, entry["refs"] - 1)
+        if not os.path.exists(self.path(*key)):
+            # Failed clone or removed from outside, nothing left to keep track of
+            if entry["refs"] == 0:
+                del self.entries[key]
+            return
+        # Improved outputs are written while they are in use, so measure them again
+        entry["size"] = directory_size(self.path(*key))
+        self.enforce_quota()
+
+    # Function to take a reference on an empty output directory for the improved code of a repository
+    def acquire_improved(self, repo_url):
+        key = (IMPROVED, repo_name_from_url(repo_url))
+        improved_path = self.path(*key)
+        # The improvement appends to the files, so leftovers of an earlier run have to go
+        if os.path.exists(improved_path):
+            shutil.rmtree(improved_path)
+        os.makedirs(improved_path)
+        refs = self.entries[key]["refs"] if key in self.entries else 0
+        self.entries[key] = {"size": 0, "refs": refs + 1, "owned": True}
+        self.touch(key)
+        return improved_path
+
+    def release_improved(self, repo_url):
+        self.release(repo_url, kind=IMPROVED)
+
+    # Function to get the directory of the improved code of a repository
+    def improved_path(self, repo_url):
+        return self.path(IMPROVED, repo_name_from_url(repo_url))
+
+    # Function to delete an entry from disk, regardless of the quota
+    def remove(self, repo_url, kind=CHECKOUT):
+        key = (kind, repo_name_from_url(repo_url))
+        entry_path = self.path(*key)
+        if os.path.exists(entry_path):
+            shutil.rmtree(entry_path)
+        self.entries.pop(key, None)
+        return entry_path
+
+    # Function to evict unreferenced entries, least recently used first, until the quota is met
+    def enforce_quota(self, exclude=None):
+        if self.quota_bytes is None:
+            return
+        used = self.used_bytes()
+        for key in list(self.entries):
+            if used <= self.quota_bytes:
+                break
+            entry = self.entries[key]
+            if entry["refs"] > 0 or not entry["owned"] or key[0] not in self.evictable or key == exclude:
+                continue
+            shutil.rmtree(self.path(*key), ignore_errors=True)
+            del self.entries[key]
+            used -= entry["size"]
+            self.stats["evicted"] += 1
+            self.stats["evicted_bytes"] += entry["size"]
+            print(f"Evicted {key[0]} {key[1]} ({format_size(entry['size'])}) from the workspace.")
+
+        improved_bytes = self.used_bytes([IMPROVED])
+        if IMPROVED not in self.evictable and improved_bytes > self.quota_bytes and not self.warned_quota:
+            self.warned_quota = True
+            print(f"Warning: the kept improved outputs ({format_size(improved_bytes)}) exceed the disk quota "
+                  f"of {format_size(self.quota_bytes)}.")
+
+    # Function to print how many bytes were cloned and how many were reused from disk
+    def report(self):
+        stats = self.stats
+        print(f"Workspace: cloned {format_size(stats['cloned_bytes'])} in {stats['cloned']} checkouts, "
+              f"reused {format_size(stats['reused_bytes'])} in {stats['reused']} checkouts, "
+              f"evicted {format_size(stats['evicted_bytes'])} in {stats['evicted']} entries, "
+              f"{format_size(self.used_bytes())} on disk.")
+        return dict(stats)
+
+    # Function to remove the temporary checkouts, checkouts in a normal directory are kept
+    def close(self):
+        if self.temp_root:
+            shutil.rmtree(self.temp_root, ignore_errors=True)
+            self.temp_root = None
+
+
+# The workspace used by the pipeline, created on first use
+workspace = None
+
+
+# Function to replace the workspace used by the pipeline
+def configure_workspace(**kwargs):
+    global workspace
+    if workspace is not None:
+        workspace.close()
+    workspace = Workspace(**kwargs)
+    return workspace
+
+def get_workspace():
+    global workspace
+    if workspace is None:
+        workspace = Workspace()
+    return workspace